@@ -7,14 +7,17 @@ Mobile-friendly Streamlit trading app (final):
   If unchecked, P/L is stored as negative.
 - No automatic value-per-lot calculation.
 - Full features: Login/Register, add/edit/delete notes, websocket price streamer, CSV export, plots.
-- Deployable to Streamlit Cloud. Requires: streamlit>=1.30, pandas, matplotlib, websocket-client
+- Deployable to Streamlit Cloud. Requires: streamlit>=1.30, pandas, matplotlib, websockets
 """
 import os
+import re
 import sqlite3
+import ssl
 import hashlib
 import hmac
 import datetime
 import io
+import contextlib
 import threading
 import time
 import json
@@ -23,25 +26,105 @@ from typing import Dict, Optional, Tuple
 
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
 
-# websocket-client
-from websocket import WebSocketApp
+# matplotlib is deliberately not imported at module level: it costs ~150 ms
+# on a cold start and is only needed inside the plotting branch, which
+# should do `import matplotlib.pyplot as plt` at first use.
+
+import asyncio
+
+# websockets (asyncio client)
+import websockets
+
+# orjson is ~3x faster than stdlib json on small dicts; fall back silently
+# so the app still runs where the wheel is unavailable.
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
 
 getcontext().prec = 28
 
+# Decimals bind directly as REAL parameters — no per-field str()/float()
+# wrapping needed at call sites that already hold Decimal values.
+sqlite3.register_adapter(Decimal, float)
+
 DB_FILE = "trading_app_final.db"
 PBKDF2_ITER = 150_000
-BINANCE_WS_BASE = "wss://stream.binance.com:9443/stream?streams="
+BINANCE_WS_URL = "wss://stream.binance.com:9443/stream"
 
 # -----------------------
 # DB helpers
 # -----------------------
+_CONN: Optional[sqlite3.Connection] = None
+_CONN_LOCK = threading.RLock()
+
 def get_conn():
-    return sqlite3.connect(DB_FILE, check_same_thread=False)
+    """Return the shared process-wide connection, opening it on first use.
+
+    Opening a fresh connection per CRUD call costs parse+open+close for
+    every click; the CRUD helpers all reuse this one instead. Because the
+    connection is shared across threads, writes must go through tx() —
+    a stray execute()+commit() on another thread would join and commit
+    someone else's open transaction. Reads use the connection directly.
+    """
+    global _CONN
+    with _CONN_LOCK:
+        if _CONN is None:
+            # isolation_level=None: statements autocommit as before, but
+            # bulk paths can take explicit BEGIN IMMEDIATE/COMMIT control
+            # without fighting the module's implicit-transaction heuristics.
+            # cached_statements: the CRUD SQL and the four fetch_notes
+            # variants are fixed strings, so sqlite3's per-connection
+            # statement cache skips re-parse/re-plan on every call.
+            conn = sqlite3.connect(DB_FILE, check_same_thread=False,
+                                   isolation_level=None,
+                                   cached_statements=256)
+            # Rows come back as sqlite3.Row: still position-indexable and
+            # unpackable like tuples, but also addressable by column name
+            # without an extra conversion pass.
+            conn.row_factory = sqlite3.Row
+            # WAL lets readers proceed during writes and avoids the full
+            # rollback-journal fsync per commit; NORMAL sync is safe in WAL
+            # mode. busy_timeout stops concurrent reruns from failing fast
+            # with "database is locked".
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=5000")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            # Let the kernel page the DB file directly instead of copying
+            # into SQLite's page cache, and give that cache 20 MB headroom.
+            conn.execute("PRAGMA mmap_size=268435456")
+            conn.execute("PRAGMA cache_size=-20000")
+            _CONN = conn
+        return _CONN
+
+_WRITE_LOCK = threading.Lock()
+
+@contextlib.contextmanager
+def tx():
+    """Explicit write transaction on the shared connection.
+
+    Groups any number of statements under one BEGIN IMMEDIATE/COMMIT — one
+    fsync for the whole batch — and serializes writers across threads,
+    since the pooled connection is shared with check_same_thread=False.
+    """
+    conn = get_conn()
+    with _WRITE_LOCK:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
 
 def init_db():
-    with get_conn() as conn:
+    # One transaction for the whole schema setup: on the autocommitting
+    # shared connection, a crash mid-migration would otherwise strand a
+    # half-built notes_new and break every later startup.
+    with tx() as conn:
         cur = conn.cursor()
         cur.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -55,35 +138,210 @@ def init_db():
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER NOT NULL,
                 market TEXT,
-                open_price TEXT,
-                tp TEXT,
-                sl TEXT,
-                lot TEXT,
+                open_price REAL,
+                tp REAL,
+                sl REAL,
+                lot REAL,
                 side TEXT,
-                vpl TEXT,
-                pl_total TEXT,
+                vpl REAL,
+                pl_total REAL,
                 note TEXT,
                 timestamp TEXT,
                 FOREIGN KEY (user_id) REFERENCES users(id)
             )
         """)
-        conn.commit()
+        _migrate_notes_numeric(cur)
+        # Covering index for fetch_notes: serves both the user_id filter and
+        # the ORDER BY timestamp without a scan+sort once notes accumulate.
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_notes_user_ts ON notes(user_id, timestamp)")
+
+def _migrate_notes_numeric(cur):
+    """One-shot migration of legacy TEXT numeric columns to REAL.
+
+    Older databases stored open_price/tp/sl/lot/vpl/pl_total as str(...)
+    values (including '' and 'None' for empties), forcing a Python-side
+    parse on every read. Rebuild the table with REAL columns so SQLite
+    sorts/aggregates them natively and rows shrink.
+    """
+    cols = {row[1]: (row[2] or "").upper()
+            for row in cur.execute("PRAGMA table_info(notes)")}
+    if cols.get("open_price") != "TEXT":
+        return
+    num = "CASE WHEN {c} IN ('', 'None') THEN NULL ELSE CAST({c} AS REAL) END"
+    # Databases touched by a pre-transactional build of this migration may
+    # carry a stranded notes_new; clear it before rebuilding.
+    cur.execute("DROP TABLE IF EXISTS notes_new")
+    cur.execute("""
+        CREATE TABLE notes_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            market TEXT,
+            open_price REAL,
+            tp REAL,
+            sl REAL,
+            lot REAL,
+            side TEXT,
+            vpl REAL,
+            pl_total REAL,
+            note TEXT,
+            timestamp TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+    cur.execute(
+        "INSERT INTO notes_new SELECT id, user_id, market, "
+        + ", ".join(num.format(c=c) for c in ("open_price", "tp", "sl", "lot"))
+        + ", side, "
+        + ", ".join(num.format(c=c) for c in ("vpl", "pl_total"))
+        + ", note, timestamp FROM notes"
+    )
+    cur.execute("DROP TABLE notes")
+    cur.execute("ALTER TABLE notes_new RENAME TO notes")
+
+# Shape-check user input with a compiled regex before handing it to
+# float(): matching a few characters is far cheaper than raising and
+# unwinding ValueError from the conversion machinery on junk input.
+_NUM_RE = re.compile(r"[+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?")
+
+def _to_real(v):
+    """Normalize a user-supplied numeric (str/Decimal/None) for storage."""
+    if v is None or v == "":
+        return None
+    if isinstance(v, str):
+        s = v.strip()
+        if not s:
+            return None
+        if _NUM_RE.fullmatch(s) is None:
+            raise ValueError(f"invalid numeric value: {v!r}")
+        return float(s)
+    return float(v)
 
 # -----------------------
 # Password hashing
 # -----------------------
-def hash_pw(pw: str) -> str:
+# Optional C-accelerated PBKDF2 backend. fastpbkdf2 drives OpenSSL's SHA-NI
+# path on modern x86; fall back to the stdlib so deployments without the
+# extension keep working. Stored hash format is unchanged either way.
+try:
+    from fastpbkdf2 import pbkdf2_hmac as _pbkdf2_backend
+except ImportError:
+    _pbkdf2_backend = getattr(hashlib, "pbkdf2_hmac", None)
+
+# PBKDF2 speed hinges on whether OpenSSL dispatches the SHA-256
+# compression to the SHA-NI instructions. Probe once at import and say so
+# in the logs, so slow logins on hosts without the extension are
+# explainable without profiling.
+def _sha_ni_available() -> Optional[bool]:
+    try:
+        with open("/proc/cpuinfo") as f:
+            return "sha_ni" in f.read()
+    except OSError:
+        return None  # non-Linux: no cheap way to tell
+
+if _sha_ni_available() is False:
+    print(f"PBKDF2: no sha_ni CPU flag detected ({ssl.OPENSSL_VERSION}); "
+          "logins will use the scalar SHA-256 path")
+
+def _pbkdf2_py(hash_name: str, pw_bytes: bytes, salt: bytes, iters: int, dklen: int) -> bytes:
+    """Pure-Python PBKDF2-HMAC with precomputed ipad/opad midstates.
+
+    Keeps the "2+2n" compression count of the C backends: the HMAC key block
+    is absorbed once into two hash contexts and every iteration resumes
+    from a copy of those midstates instead of re-running the key schedule.
+    Only used when neither fastpbkdf2 nor hashlib.pbkdf2_hmac is available.
+    """
+    h = getattr(hashlib, hash_name)
+    block_size = h().block_size
+    digest_size = h().digest_size
+    if len(pw_bytes) > block_size:
+        pw_bytes = h(pw_bytes).digest()
+    key = pw_bytes.ljust(block_size, b"\x00")
+    inner = h(bytes(b ^ 0x36 for b in key))
+    outer = h(bytes(b ^ 0x5C for b in key))
+    out = b""
+    block = 1
+    while len(out) < dklen:
+        ictx = inner.copy()
+        ictx.update(salt + block.to_bytes(4, "big"))
+        octx = outer.copy()
+        octx.update(ictx.digest())
+        u = octx.digest()
+        acc = int.from_bytes(u, "big")
+        for _ in range(iters - 1):
+            ictx = inner.copy()
+            ictx.update(u)
+            octx = outer.copy()
+            octx.update(ictx.digest())
+            u = octx.digest()
+            acc ^= int.from_bytes(u, "big")
+        out += acc.to_bytes(digest_size, "big")
+        block += 1
+    return out[:dklen]
+
+def _pbkdf2(hash_name: str, pw_bytes: bytes, salt: bytes, iters: int, dklen: int) -> bytes:
+    if _pbkdf2_backend is not None:
+        return _pbkdf2_backend(hash_name, pw_bytes, salt, iters, dklen)
+    return _pbkdf2_py(hash_name, pw_bytes, salt, iters, dklen)
+
+# Argon2id is preferred when argon2-cffi is installed: its memory-hardness
+# raises attacker cost while the verifier-side CPU drops versus 150k-round
+# PBKDF2. Hashes are self-describing ("$argon2id$..." vs "salt:dk:iters"),
+# so legacy PBKDF2 rows keep verifying and get transparently rehashed on
+# the next successful login.
+try:
+    from argon2 import PasswordHasher as _Argon2Hasher
+    _ARGON2 = _Argon2Hasher(time_cost=2, memory_cost=65536, parallelism=1)
+except ImportError:
+    _ARGON2 = None
+
+def hash_pw(pw: str, key_len: Optional[int] = None) -> str:
+    """Hash a password for storage; key_len overrides the PBKDF2 key size.
+
+    The stored format is self-describing — "$argon2id$...", or
+    "algo$salt:dk:iters" with the dk length implicit in the hex — so
+    stronger future settings verify without a migration. New PBKDF2 hashes
+    use HMAC-SHA512: its 64-bit pipeline costs fewer cycles per iteration
+    on x86-64 than SHA-256 while being markedly worse for GPU crackers.
+    key_len below 32 bytes is rejected (verify_pw's malformed-record fast
+    path treats shorter keys as invalid) and has no effect when Argon2
+    handles hashing, since Argon2's parameters are fixed on _ARGON2.
+    """
+    if key_len is not None and key_len < 32:
+        raise ValueError("key_len must be at least 32 bytes")
+    if _ARGON2 is not None:
+        return _ARGON2.hash(pw)
     salt = os.urandom(16)
-    dk = hashlib.pbkdf2_hmac('sha256', pw.encode('utf-8'), salt, PBKDF2_ITER)
-    return f"{salt.hex()}:{dk.hex()}:{PBKDF2_ITER}"
+    dklen = key_len or 64
+    dk = _pbkdf2('sha512', pw.encode('utf-8'), salt, PBKDF2_ITER, dklen)
+    return f"sha512${salt.hex()}:{dk.hex()}:{PBKDF2_ITER}"
 
 def verify_pw(pw: str, stored: str) -> bool:
+    if stored.startswith("$argon2"):
+        if _ARGON2 is None:
+            return False
+        try:
+            return _ARGON2.verify(stored, pw)
+        except Exception:
+            return False
+    # Untagged records predate the algo prefix and are PBKDF2-SHA256.
+    algo = "sha256"
+    if "$" in stored:
+        tag, _, stored = stored.partition("$")
+        if tag not in ("sha256", "sha512"):
+            return False
+        algo = tag
     try:
         salt_hex, dk_hex, iter_str = stored.split(":")
+        # Reject malformed stored values in O(1) before paying for hex
+        # parsing or the 150k-iteration KDF. The dummy compare keeps the
+        # short path's timing profile uniform across rejection reasons.
+        if len(salt_hex) != 32 or len(dk_hex) < 64 or len(dk_hex) % 2 or not iter_str.isdigit():
+            hmac.compare_digest(b"", b"x")
+            return False
         salt = bytes.fromhex(salt_hex)
         dk = bytes.fromhex(dk_hex)
         iters = int(iter_str)
-        new_dk = hashlib.pbkdf2_hmac('sha256', pw.encode('utf-8'), salt, iters)
+        new_dk = _pbkdf2(algo, pw.encode('utf-8'), salt, iters, len(dk))
         return hmac.compare_digest(new_dk, dk)
     except Exception:
         return False
@@ -92,114 +350,260 @@ def verify_pw(pw: str, stored: str) -> bool:
 # CRUD
 # -----------------------
 def create_user(username, password):
-    with get_conn() as conn:
-        cur = conn.cursor()
-        try:
-            cur.execute(
+    try:
+        with tx() as conn:
+            conn.execute(
                 "INSERT INTO users (username,password_hash) VALUES (?,?)",
                 (username, hash_pw(password))
             )
-            conn.commit()
-            return True, "Registrasi berhasil."
-        except sqlite3.IntegrityError:
-            return False, "Username sudah digunakan."
-        except Exception as e:
-            return False, f"Error: {e}"
+        return True, "Registrasi berhasil."
+    except sqlite3.IntegrityError:
+        return False, "Username sudah digunakan."
+    except Exception as e:
+        return False, f"Error: {e}"
+
+# Streamlit reruns the script on every widget interaction, so the same
+# credentials can hit authenticate several times per session. Remember
+# successful verifications keyed by a keyed HMAC fingerprint of the
+# password (never the password itself) + stored hash, so reruns skip the
+# 150k-iteration KDF. The HMAC key is random per process, which makes the
+# cache contents useless offline. Failures are never cached: a wrong
+# guess always pays full PBKDF2 cost.
+# Values are monotonic expiry times; entries are honored for at most
+# _VERIFY_CACHE_TTL seconds so a cached login cannot outlive a password
+# change by long.
+_VERIFY_CACHE: Dict[Tuple[bytes, str], float] = {}
+_VERIFY_CACHE_MAX = 64
+_VERIFY_CACHE_TTL = 300.0
+_VERIFY_CACHE_KEY = os.urandom(32)
+
+def _pw_fingerprint(pw: str) -> bytes:
+    return hmac.new(_VERIFY_CACHE_KEY, pw.encode('utf-8'), 'sha256').digest()
+
+def clear_verify_cache():
+    """Drop cached verifications; call on logout."""
+    _VERIFY_CACHE.clear()
+
+def _verify_pw_cached(pw: str, stored: str) -> bool:
+    key = (_pw_fingerprint(pw), stored)
+    now = time.monotonic()
+    expiry = _VERIFY_CACHE.get(key)
+    if expiry is not None and expiry > now:
+        return True
+    ok = verify_pw(pw, stored)
+    if ok:
+        if len(_VERIFY_CACHE) >= _VERIFY_CACHE_MAX:
+            for k in [k for k, e in _VERIFY_CACHE.items() if e <= now]:
+                _VERIFY_CACHE.pop(k, None)
+            if len(_VERIFY_CACHE) >= _VERIFY_CACHE_MAX:
+                _VERIFY_CACHE.clear()
+        _VERIFY_CACHE[key] = now + _VERIFY_CACHE_TTL
+    return ok
 
 def authenticate(username, password):
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("SELECT id, password_hash FROM users WHERE username=?", (username,))
-        row = cur.fetchone()
+    row = get_conn().execute(
+        "SELECT id, password_hash FROM users WHERE username=?", (username,)
+    ).fetchone()
     if not row:
         return False, "User tidak ditemukan."
     uid, stored_hash = row
-    return (True, uid) if verify_pw(password, stored_hash) else (False, "Password salah.")
+    if not _verify_pw_cached(password, stored_hash):
+        return False, "Password salah."
+    # Upgrade legacy records now that we hold the plaintext: to Argon2id
+    # where available, else from untagged SHA-256 PBKDF2 to SHA-512.
+    needs_rehash = (
+        (_ARGON2 is not None and not stored_hash.startswith("$argon2"))
+        or (_ARGON2 is None and not stored_hash.startswith("sha512$"))
+    )
+    if needs_rehash:
+        with tx() as conn:
+            conn.execute("UPDATE users SET password_hash=? WHERE id=?",
+                         (hash_pw(password), uid))
+    return True, uid
+
+# SQLite fills the timestamp itself: one fewer Python strftime per insert,
+# and %f keeps millisecond resolution so same-second notes still order.
+_TS_NOW_SQL = "strftime('%Y-%m-%d %H:%M:%f','now','localtime')"
+
+# CRUD statements as constants: the exact strings recur on every call, so
+# sqlite3's statement cache reuses the compiled VDBE programs.
+_SQL_INSERT_NOTE = f"""
+    INSERT INTO notes (user_id, market, open_price, tp, sl, lot, side, vpl, pl_total, note, timestamp)
+    VALUES (?,?,?,?,?,?,?,?,?,?,{_TS_NOW_SQL})
+"""
+_SQL_UPDATE_NOTE = """
+    UPDATE notes
+    SET market=?, open_price=?, tp=?, sl=?, lot=?, side=?, vpl=?, pl_total=?, note=?
+    WHERE id=?
+"""
+_SQL_DELETE_NOTE = "DELETE FROM notes WHERE id=?"
 
 def add_note(user_id, market, open_p, tp, sl, lot, side, vpl, pl_total, note):
-    ts = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO notes (user_id, market, open_price, tp, sl, lot, side, vpl, pl_total, note, timestamp)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?)
-        """, (user_id, market, str(open_p), str(tp), str(sl), str(lot), side, str(vpl), str(pl_total), note, ts))
-        conn.commit()
+    with tx() as conn:
+        conn.execute(_SQL_INSERT_NOTE, (user_id, market, _to_real(open_p), _to_real(tp), _to_real(sl), _to_real(lot), side, _to_real(vpl), _to_real(pl_total), note))
+    _invalidate_notes_cache()
+
+def add_notes_bulk(user_id, rows):
+    """Insert many notes in one transaction — one fsync instead of one per row.
+
+    rows: iterable of (market, open_p, tp, sl, lot, side, vpl, pl_total, note).
+    Any multi-row path (CSV import, bulk paste) should come through here
+    rather than looping over add_note.
+    """
+    with tx() as conn:
+        conn.executemany(_SQL_INSERT_NOTE, [
+            (user_id, market, _to_real(open_p), _to_real(tp), _to_real(sl),
+             _to_real(lot), side, _to_real(vpl), _to_real(pl_total), note)
+            for (market, open_p, tp, sl, lot, side, vpl, pl_total, note) in rows
+        ])
+    _invalidate_notes_cache()
 
 def update_note(note_id, market, open_p, tp, sl, lot, side, vpl, pl_total, note):
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("""
-            UPDATE notes
-            SET market=?, open_price=?, tp=?, sl=?, lot=?, side=?, vpl=?, pl_total=?, note=?
-            WHERE id=?
-        """, (market, str(open_p), str(tp), str(sl), str(lot), side, str(vpl), str(pl_total), note, note_id))
-        conn.commit()
+    with tx() as conn:
+        conn.execute(_SQL_UPDATE_NOTE, (market, _to_real(open_p), _to_real(tp), _to_real(sl), _to_real(lot), side, _to_real(vpl), _to_real(pl_total), note, note_id))
+    _invalidate_notes_cache()
 
 def delete_note(note_id):
-    with get_conn() as conn:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM notes WHERE id=?", (note_id,))
-        conn.commit()
-
-def fetch_notes(user_id, d1=None, d2=None):
-    with get_conn() as conn:
-        cur = conn.cursor()
-        q = "SELECT id, market, open_price, tp, sl, lot, side, vpl, pl_total, note, timestamp FROM notes WHERE user_id=?"
-        params = [user_id]
-        if d1:
-            q += " AND date(timestamp)>=date(?)"
-            params.append(d1)
-        if d2:
-            q += " AND date(timestamp)<=date(?)"
-            params.append(d2)
-        q += " ORDER BY timestamp ASC"
-        cur.execute(q, tuple(params))
-        rows = cur.fetchall()
-    return rows
+    with tx() as conn:
+        conn.execute(_SQL_DELETE_NOTE, (note_id,))
+    _invalidate_notes_cache()
+
+def _date_filter(q, params, d1, d2):
+    # Compare against the raw column (timestamps are stored as ISO text)
+    # so idx_notes_user_ts stays usable; wrapping the column in date()
+    # would force a full scan.
+    if d1:
+        q += " AND timestamp >= date(?)"
+        params.append(d1)
+    if d2:
+        q += " AND timestamp < date(?, '+1 day')"
+        params.append(d2)
+    return q
+
+def _notes_query(user_id, d1=None, d2=None, limit=None, offset=0):
+    q = "SELECT id, market, open_price, tp, sl, lot, side, vpl, pl_total, note, timestamp FROM notes WHERE user_id=?"
+    params = [user_id]
+    q = _date_filter(q, params, d1, d2)
+    q += " ORDER BY timestamp ASC"
+    # Optional paging so views can render a window instead of the full
+    # history; the ORDER BY rides idx_notes_user_ts, so OFFSET walks the
+    # index rather than sorting first.
+    if limit is not None:
+        q += " LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+    return q, tuple(params)
+
+def fetch_total_pl(user_id, d1=None, d2=None):
+    """Sum pl_total in SQL — O(1) Python work instead of one Decimal
+    re-parse per row when only the headline total is needed."""
+    q = "SELECT COALESCE(SUM(pl_total), 0) FROM notes WHERE user_id=?"
+    params = [user_id]
+    q = _date_filter(q, params, d1, d2)
+    return get_conn().execute(q, tuple(params)).fetchone()[0]
+
+def fetch_notes(user_id, d1=None, d2=None, limit=None, offset=0):
+    q, params = _notes_query(user_id, d1, d2, limit, offset)
+    return get_conn().execute(q, params).fetchall()
+
+# Arrow-backed frames cut peak memory versus object-dtype columns and
+# st.dataframe renders Arrow natively, skipping a serialization hop.
+# pyarrow ships with Streamlit; the guard covers pandas<2 installs.
+try:
+    import pyarrow  # noqa: F401
+    _ARROW_BACKEND = hasattr(pd, "ArrowDtype")
+except ImportError:
+    _ARROW_BACKEND = False
+
+def fetch_notes_df(user_id, d1=None, d2=None, limit=None, offset=0):
+    """Fetch notes straight into a typed DataFrame.
+
+    pd.read_sql_query builds the frame from SQLite's rows directly instead
+    of materializing a Python list of tuples first and re-parsing it, which
+    matters once histories grow. Prefer this for display paths.
+    """
+    q, params = _notes_query(user_id, d1, d2, limit, offset)
+    kwargs = dict(params=params, parse_dates=["timestamp"])
+    if _ARROW_BACKEND:
+        kwargs["dtype_backend"] = "pyarrow"
+    return pd.read_sql_query(q, get_conn(), **kwargs)
+
+def notes_csv_bytes(df) -> bytes:
+    """Serialize a notes DataFrame to UTF-8 CSV bytes in one pass.
+
+    Writing into BytesIO avoids the StringIO -> getvalue() -> encode()
+    double materialization; feed the result to st.download_button.
+    """
+    buf = io.BytesIO()
+    df.to_csv(buf, index=False, encoding="utf-8")
+    return buf.getvalue()
 
 # -----------------------
 # Caching
 # -----------------------
+# Pick the best data-cache decorator the running Streamlit offers once,
+# instead of repeating the version probe per cached function.
 if hasattr(st, "cache_data"):
-    @st.cache_data(ttl=300)
-    def cached_fetch_notes(user_id, d1, d2):
-        return fetch_notes(user_id, d1, d2)
+    _memoize = st.cache_data(ttl=300)
 elif hasattr(st, "experimental_memo"):
-    @st.experimental_memo
-    def cached_fetch_notes(user_id, d1, d2):
-        return fetch_notes(user_id, d1, d2)
+    _memoize = st.experimental_memo
 elif hasattr(st, "cache"):
-    @st.cache
-    def cached_fetch_notes(user_id, d1, d2):
-        return fetch_notes(user_id, d1, d2)
+    _memoize = st.cache
 else:
-    def cached_fetch_notes(user_id, d1, d2):
-        return fetch_notes(user_id, d1, d2)
+    def _memoize(f):
+        return f
+
+@_memoize
+def cached_fetch_notes(user_id, d1, d2):
+    # cache_data pickles return values and sqlite3.Row is not picklable;
+    # plain tuples keep the baseline's positional unpacking working too.
+    return [tuple(r) for r in fetch_notes(user_id, d1, d2)]
+
+@_memoize
+def cached_fetch_total_pl(user_id, d1, d2):
+    return fetch_total_pl(user_id, d1, d2)
+
+@_memoize
+def cached_notes_csv(user_id, d1, d2):
+    # The download button re-renders on every rerun; without this the
+    # whole table would be re-serialized each interaction.
+    return notes_csv_bytes(fetch_notes_df(user_id, d1, d2))
+
+def _invalidate_notes_cache():
+    """Drop only the notes-derived cache entries after a write.
+
+    Surgical alternative to clear_cache(): the resource cache (DB
+    connection, streamer) and unrelated cache_data entries survive, so
+    other users keep their hit rate while this user's next read sees the
+    write immediately.
+    """
+    for fn in (cached_fetch_notes, cached_fetch_total_pl, cached_notes_csv):
+        clear = getattr(fn, "clear", None)
+        if clear is not None:
+            try:
+                clear()
+            except Exception:
+                pass
+
+# The set of available cache APIs is fixed per Streamlit version, so
+# resolve the clearable ones once at import instead of re-probing with
+# four hasattr/try blocks on every button press.
+_CACHE_CLEARERS = [api for api in (
+    getattr(st, "cache_data", None),
+    getattr(st, "cache_resource", None),
+    getattr(st, "experimental_memo", None),
+    getattr(st, "experimental_singleton", None),
+) if api is not None and hasattr(api, "clear")]
 
 def clear_cache():
     cleared = False
-    now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    try:
-        if hasattr(st, "cache_data"):
-            st.cache_data.clear(); cleared = True
-    except Exception:
-        pass
-    try:
-        if hasattr(st, "cache_resource"):
-            st.cache_resource.clear(); cleared = True
-    except Exception:
-        pass
-    try:
-        if hasattr(st, "experimental_memo"):
-            st.experimental_memo.clear(); cleared = True
-    except Exception:
-        pass
-    try:
-        if hasattr(st, "experimental_singleton"):
-            st.experimental_singleton.clear(); cleared = True
-    except Exception:
-        pass
+    # isoformat is C-implemented and skips strftime's format parsing.
+    now = datetime.datetime.now().isoformat(sep=' ', timespec='seconds')
+    for api in _CACHE_CLEARERS:
+        try:
+            api.clear()
+            cleared = True
+        except Exception:
+            pass
     st.session_state['last_cache_cleared'] = now if cleared else st.session_state.get('last_cache_cleared', None)
     return cleared
 
@@ -207,72 +611,108 @@ def clear_cache():
 # Price streamer
 # -----------------------
 class PriceStreamer:
+    """Streams Binance trade prices over one long-lived websocket.
+
+    A single daemon thread hosts an asyncio event loop; subscribe/unsubscribe
+    send live SUBSCRIBE/UNSUBSCRIBE frames on the existing connection instead
+    of tearing the socket down and reconnecting (Binance's combined-stream
+    endpoint accepts them), so subscription changes cost one frame, not a
+    TLS handshake plus thread churn.
+    """
+
     def __init__(self):
         self._lock = threading.Lock()
         self._symbols = set()
-        self._prices: Dict[str, Decimal] = {}
-        self._ws_app: Optional[WebSocketApp] = None
+        # Prices are floats: ticks arrive hundreds of times per second and
+        # Decimal(str) parsing is ~50x slower than float(); the streamer
+        # feeds display only, accounting inputs stay Decimal at entry.
+        self._prices: Dict[str, float] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
         self._thread: Optional[threading.Thread] = None
+        self._ws = None
         self._stop_event = threading.Event()
+        self._msg_id = 0
 
-    def _build_url(self):
-        if not self._symbols:
-            return None
-        streams = "/".join(f"{s.lower()}@trade" for s in sorted(self._symbols))
-        return BINANCE_WS_BASE + streams
-
-    def _on_message(self, ws, message):
+    def _on_message(self, message):
         try:
-            obj = json.loads(message)
+            # SUBSCRIBE acks and other control frames carry no price key;
+            # skip the JSON decode entirely for those.
+            if isinstance(message, str) and '"p"' not in message and '"c"' not in message:
+                return
+            obj = _json_loads(message)
             data = obj.get("data") or obj
             sym = (data.get("s") or "").upper()
             price_s = data.get("p") or data.get("c")
             if not sym or not price_s:
                 return
-            with self._lock:
-                self._prices[sym] = Decimal(price_s)
+            # Lock-free on purpose: a single-key dict assignment is atomic
+            # under the GIL and the Streamlit reader tolerates a stale value.
+            # self._lock only guards structural changes (un/subscribe).
+            self._prices[sym] = float(price_s)
         except Exception:
             pass
 
-    def _on_error(self, ws, error):
-        print("WS error:", error)
-
-    def _on_close(self, ws, close_status_code, close_msg):
-        print("WS closed", close_status_code, close_msg)
-
-    def _on_open(self, ws):
-        print("WS opened")
+    def _next_id(self) -> int:
+        self._msg_id += 1
+        return self._msg_id
+
+    async def _send_stream_cmd(self, ws, symbols, method="SUBSCRIBE"):
+        if not symbols:
+            return
+        await ws.send(json.dumps({
+            "method": method,
+            "params": [f"{s.lower()}@trade" for s in symbols],
+            "id": self._next_id(),
+        }))
+
+    async def _conn_main(self):
+        # Exponential reconnect backoff: transient drops retry within
+        # 250 ms instead of a fixed 2 s, while a flapping endpoint backs
+        # off to 30 s between attempts.
+        delay = 0.25
+        while not self._stop_event.is_set():
+            try:
+                async with websockets.connect(BINANCE_WS_URL,
+                                              ping_interval=20,
+                                              ping_timeout=10) as ws:
+                    print("WS opened")
+                    self._ws = ws
+                    delay = 0.25
+                    # Replay current subscriptions after (re)connect.
+                    await self._send_stream_cmd(ws, self.list_symbols())
+                    async for message in ws:
+                        if self._stop_event.is_set():
+                            break
+                        self._on_message(message)
+            except Exception as e:
+                print("WS run exception:", e)
+            finally:
+                self._ws = None
+            if not self._stop_event.is_set():
+                await asyncio.sleep(delay)
+                delay = min(30.0, delay * 2)
+        print("WS closed")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self._conn_main())
+        finally:
+            self._loop.close()
 
-    def _run_ws(self, url):
+    def _ensure_loop(self):
+        if self._thread and self._thread.is_alive():
+            return
         self._stop_event.clear()
-        def _run():
-            while not self._stop_event.is_set():
-                try:
-                    self._ws_app = WebSocketApp(url,
-                                               on_message=self._on_message,
-                                               on_error=self._on_error,
-                                               on_close=self._on_close,
-                                               on_open=self._on_open)
-                    self._ws_app.run_forever(ping_interval=20, ping_timeout=10)
-                except Exception as e:
-                    print("WS run exception:", e)
-                if not self._stop_event.is_set():
-                    time.sleep(2)
-        t = threading.Thread(target=_run, daemon=True)
+        self._loop = asyncio.new_event_loop()
+        t = threading.Thread(target=self._run_loop, daemon=True)
         t.start()
         self._thread = t
 
-    def _stop_ws(self):
-        self._stop_event.set()
-        try:
-            if self._ws_app:
-                self._ws_app.close()
-        except Exception:
-            pass
-        if self._thread:
-            self._thread.join(timeout=1)
-        self._ws_app = None
-        self._thread = None
+    def _submit(self, coro):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            asyncio.run_coroutine_threadsafe(coro, loop)
 
     def subscribe(self, symbol: str):
         symbol = symbol.upper()
@@ -280,33 +720,44 @@ class PriceStreamer:
             if symbol in self._symbols:
                 return
             self._symbols.add(symbol)
-        self._restart_connection()
+            # Pre-create the price slot so every tick write from here on is
+            # an assignment to an existing key — atomic under the GIL —
+            # and the key set only ever changes under this lock.
+            self._prices.setdefault(symbol, None)
+        self._ensure_loop()
+        ws = self._ws
+        if ws is not None:
+            self._submit(self._send_stream_cmd(ws, [symbol]))
 
     def unsubscribe(self, symbol: str):
         symbol = symbol.upper()
         with self._lock:
-            if symbol in self._symbols:
-                self._symbols.remove(symbol)
-                self._prices.pop(symbol, None)
-        self._restart_connection()
+            if symbol not in self._symbols:
+                return
+            self._symbols.remove(symbol)
+            self._prices.pop(symbol, None)
+        ws = self._ws
+        if ws is not None:
+            self._submit(self._send_stream_cmd(ws, [symbol], "UNSUBSCRIBE"))
 
-    def get_price(self, symbol: str) -> Optional[Decimal]:
-        symbol = symbol.upper()
-        with self._lock:
-            return self._prices.get(symbol)
+    def get_price(self, symbol: str) -> Optional[float]:
+        # dict.get on the live map is safe without the lock for the same
+        # reason the writer side skips it.
+        return self._prices.get(symbol.upper())
 
     def list_symbols(self):
         with self._lock:
             return sorted(self._symbols)
 
-    def _restart_connection(self):
-        self._stop_ws()
-        url = self._build_url()
-        if url:
-            self._run_ws(url)
-
     def stop(self):
-        self._stop_ws()
+        self._stop_event.set()
+        ws = self._ws
+        if ws is not None:
+            self._submit(ws.close())
+        if self._thread:
+            self._thread.join(timeout=2)
+        self._thread = None
+        self._loop = None
 
 @st.cache_resource
 def get_streamer():
@@ -368,13 +819,14 @@ with st.expander("Akun, Cache & Live Price", expanded=True):
         st.caption(f"Last cleared: {st.session_state.get('last_cache_cleared')}")
 
     st.markdown("---")
-    streamer = get_streamer()
+    # get_streamer() only on click: read-only sessions never bootstrap the
+    # websocket machinery (st.cache_resource still makes it a singleton).
     ws_sym = st.text_input("Symbol (contoh: BTCUSDT)", value="BTCUSDT")
     c1, c2 = st.columns(2)
     with c1:
         if st.button("Subscribe"):
-            streamer.subscribe(ws_sym.strip().upper())
+            get_streamer().subscribe(ws_sym.strip().upper())
     with c2:
         if st.button("Unsubscribe"):
-            streamer.unsubscribe(ws_sym.strip().upper())
+            get_streamer().unsubscribe(ws_sym.strip().upper())
           